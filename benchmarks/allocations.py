@@ -0,0 +1,160 @@
+"""
+Measure how much memory is allocated while receiving and replying to each
+packet, with and without pooling packets.
+
+For each datagram, the peak memory traced while handling it is compared with
+the memory traced before, which counts temporary allocations that are freed
+again straight away, as well as any which are kept. Memory kept over the
+whole run, once warmed up, should be nothing, and the benchmark fails if it
+isn't.
+
+Run it from a checkout with::
+
+    python benchmarks/allocations.py
+"""
+
+import gc
+import itertools
+import os
+import sys
+import tracemalloc
+
+# Use the package in this checkout, rather than needing it to be installed.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from xplane.io import Protocol
+from xplane.packets import CommandPacket, DataPacket
+
+
+COMMAND = 'sim/flight_controls/brakes_toggle_regular'
+
+
+class NullTransport:
+    def sendto(self, data, address):
+        pass
+
+
+class EchoProtocol(Protocol):
+    """Sends a command for every packet received, like a control loop."""
+
+    def __init__(self, send_address):
+        super().__init__(send_address)
+
+        # The same command is sent every time, so it is only written once.
+        self.command = CommandPacket(COMMAND)
+
+    def got_data_packet(self, packet, address):
+        roll = packet[17][1]
+
+        with self.data_packets.borrow() as reply:
+            reply.write_joystick_elevator_aileron_rudder(aileron=-roll)
+            self.send_packet(reply)
+
+        self.send_packet(self.command)
+
+
+class UnpooledEchoProtocol(Protocol):
+    """The same, but allocating every packet afresh."""
+
+    def datagram_received(self, data, address):
+        self.got_data_packet(DataPacket(data), address)
+
+    def got_data_packet(self, packet, address):
+        roll = packet[17][1]
+
+        reply = DataPacket()
+        reply.write_joystick_elevator_aileron_rudder(aileron=-roll)
+        self.send_packet(reply)
+
+        self.send_packet(CommandPacket(COMMAND))
+
+
+def make_datagram():
+    packet = DataPacket()
+    for index in (3, 15, 16, 17, 20, 35, 64, 70):
+        packet[index] = tuple(float(index + i) for i in range(8))
+    return packet.write()
+
+
+def measure(protocol_class, datagram, warmup, count):
+    """
+    Returns
+    -------
+    Mean : float
+        The mean bytes allocated while handling a datagram.
+    Maximum : int
+        The most bytes allocated while handling a datagram.
+    Growth : int
+        How many more bytes are allocated after handling them all than after
+        warming up.
+    """
+
+    # Trace from the start, and empty the free lists of objects allocated
+    # beforehand, so that nothing the protocol keeps was allocated untraced,
+    # and replacing it isn't counted as growth.
+    tracemalloc.start()
+    gc.collect()
+
+    protocol = protocol_class(('127.0.0.1', 49000))
+    protocol.connection_made(NullTransport())
+
+    for _ in range(warmup):
+        protocol.datagram_received(datagram, None)
+
+    # Nothing else is run in the steady window, so that everything traced
+    # was allocated while handling packets. Counting every allocation, rather
+    # than only those made by the package, means objects reused from free
+    # lists are counted wherever they were first allocated.
+    packets = itertools.repeat(None, count)
+    gc.collect()
+    start, _ = tracemalloc.get_traced_memory()
+
+    for _ in packets:
+        protocol.datagram_received(datagram, None)
+
+    gc.collect()
+    end, _ = tracemalloc.get_traced_memory()
+    growth = end - start
+
+    total = maximum = 0
+    for _ in range(count):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        protocol.datagram_received(datagram, None)
+        _, peak = tracemalloc.get_traced_memory()
+
+        total += peak - before
+        maximum = max(maximum, peak - before)
+
+    tracemalloc.stop()
+
+    return total / count, maximum, growth
+
+
+def main():
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument('--warmup', type=int, default=1000)
+    parser.add_argument('--count', '-n', type=int, default=10000)
+    args = parser.parse_args()
+
+    datagram = make_datagram()
+
+    print('Handled {} packets of {} bytes.'.format(args.count, len(datagram)))
+
+    grew = False
+    for name, protocol_class in [('Pooled', EchoProtocol),
+                                 ('Unpooled', UnpooledEchoProtocol)]:
+        mean, maximum, growth = measure(protocol_class, datagram,
+                                        args.warmup, args.count)
+        print('{:>8}: {:.0f} bytes per packet (at most {}), {} bytes kept.'
+              .format(name, mean, maximum, growth))
+        grew = grew or growth != 0
+
+    if grew:
+        sys.exit('Memory grew while handling packets.')
+
+
+if __name__ == '__main__':
+    main()
@@ -16,13 +16,14 @@ setup(
     author='Tom Leese',
     author_email='inbox@tomleese.me.uk',
     url='https://github.com/tomleese/pyxplane',
-    packages=['xplane'],
-    install_requires=['Pint'],
+    packages=['xplane', 'xplane.cli'],
+    install_requires=['NumPy', 'Pint'],
     setup_requires=['Sphinx >=1.3', 'wheel'],
     entry_points={
         'console_scripts': [
             'xplane-show-values = xplane.cli.show_values:main',
             'xplane-autopilot = xplane.cli.autopilot:main',
+            'xplane-telemetry = xplane.cli.telemetry:main',
         ]
     },
     classifiers=[
@@ -3,11 +3,17 @@ A very simple autopilot designed to simplify testing of planes by providing an
 existing framework for getting a plane in the air.
 """
 
-from . import packets
+import math
+
+from .filters import ComplementaryFilter, FilterStage
 from .io import Protocol
 from .packets import units
 
 
+def _wrap_degrees(angle):
+    return (angle + 180) % 360 - 180
+
+
 class TakeoffMixin:
     _takeoff_state = None
     _takeoff_heading = None
@@ -15,50 +21,80 @@ class TakeoffMixin:
 
     def takeoff(self, altitude_target=300):
         self._takeoff_altitude_target = altitude_target * units.meter
+        self._takeoff_add_filters()
+        self.subscribe('takeoff', [16, 17, 20, 64])
         self.takeoff_started()
 
+    def _takeoff_add_filters(self):
+        # The heading and roll (index 17, in degrees) are smoothed with the
+        # yaw and roll rates (index 16, in radians per second), rather than
+        # steering from a single noisy sample.
+        if self.filters is None:
+            self.filters = FilterStage()
+
+        rate_scale = math.degrees(1)
+        self.filters.add('takeoff_heading',
+                         ComplementaryFilter(period=360,
+                                             rate_scale=rate_scale),
+                         (17, 2), (16, 2))
+        self.filters.add('takeoff_roll',
+                         ComplementaryFilter(period=360,
+                                             rate_scale=rate_scale),
+                         (17, 1), (16, 1))
+
+    def _takeoff_remove_filters(self):
+        self.filters.remove('takeoff_heading')
+        self.filters.remove('takeoff_roll')
+
     def takeoff_got_data_packet(self, packet, address):
         if self._takeoff_state is None:
             return False
 
+        try:
+            true_heading = self.filters['takeoff_heading']
+            roll = _wrap_degrees(self.filters['takeoff_roll'])
+        except KeyError:
+            return True  # no heading or rates received yet
+
         if self._takeoff_state == 'started':
-            _, _, true_heading, _ = packet.read_pitch_roll_headings()
             self._takeoff_heading = true_heading
             print('Landing strip heading is:', true_heading)
             self._takeoff_throttle()
             self._takeoff_state = 'throttle'
         elif self._takeoff_state == 'throttle':
-            _, roll, true_heading, _ = packet.read_pitch_roll_headings()
             lift, _, _ = packet.read_aero_forces()
             _,_, altitude, _ = packet.read_latitude_longitude_altitude()
 
-            rudder = (self._takeoff_heading - true_heading) * 5
+            heading_error = _wrap_degrees(self._takeoff_heading - true_heading)
+            rudder = math.radians(heading_error) * 5
             elevator = 0
             aileron = 0
 
             # TODO calculate this based on weight of craft
             if lift >= 5000 * units.newton:
                 elevator = 0.3
-                aileron = -roll.to(units.radians).magnitude
+                aileron = -math.radians(roll)
 
             if altitude >= self._takeoff_altitude_target:
                 elevator = -0.5
                 self.takeoff_finished()
 
-            p = packets.DataPacket()
-            p.write_joystick_elevator_aileron_rudder(rudder=rudder,
-                                                     aileron=aileron,
-                                                     elevator=elevator)
-            self.send_packet(p)
+            with self.data_packets.borrow() as p:
+                p.write_joystick_elevator_aileron_rudder(rudder=rudder,
+                                                         aileron=aileron,
+                                                         elevator=elevator)
+                self.send_packet(p)
 
         return True
 
     def _takeoff_throttle(self):
-        self.send_packet(packets.CommandPacket('sim/flight_controls/brakes_toggle_regular'))
+        with self.command_packets.borrow() as packet:
+            packet.command = 'sim/flight_controls/brakes_toggle_regular'
+            self.send_packet(packet)
 
-        packet = packets.DataPacket()
-        packet.write_throttle_command(1)
-        self.send_packet(packet)
+        with self.data_packets.borrow() as packet:
+            packet.write_throttle_command(1)
+            self.send_packet(packet)
 
         print('Throttle increased to 100%.')
 
@@ -67,3 +103,5 @@ class TakeoffMixin:
 
     def takeoff_finished(self):
         self._takeoff_state = None
+        self._takeoff_remove_filters()
+        self.unsubscribe('takeoff')
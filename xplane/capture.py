@@ -0,0 +1,141 @@
+"""
+Reading and writing captures of the raw datagrams received from X-Plane.
+
+A capture is a header followed by one record per datagram, each being the time
+it was received, its length and then its bytes.
+"""
+
+import mmap
+import struct
+
+
+MAGIC = b'XPLANECAP\x00\x01\x00'
+
+_record = struct.Struct('<dI')
+
+
+class CaptureWriter:
+    """
+    Writes datagrams to a capture file.
+
+    Parameters
+    ----------
+    fd : file
+        A file opened for writing in binary mode.
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.fd.write(MAGIC)
+
+    def write(self, time, data):
+        """
+        Write a datagram.
+
+        Parameters
+        ----------
+        time : float
+            When the datagram was received, in seconds since the epoch.
+        data : bytes
+            The raw bytes in the datagram.
+        """
+
+        self.fd.write(_record.pack(time, len(data)))
+        self.fd.write(data)
+
+
+def _check_magic(data):
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not an X-Plane capture.')
+
+
+def scan(data):
+    """
+    Find where each record starts in a capture.
+
+    Parameters
+    ----------
+    data : bytes
+        The whole capture, or a :func:`map_file` of it.
+
+    Returns
+    -------
+    list of int
+        The offset of each record.
+    """
+
+    _check_magic(data)
+
+    offsets = []
+    offset = len(MAGIC)
+
+    while offset + _record.size <= len(data):
+        _, length = _record.unpack_from(data, offset)
+        if offset + _record.size + length > len(data):
+            break  # truncated by the capture being stopped
+
+        offsets.append(offset)
+        offset += _record.size + length
+
+    return offsets
+
+
+def iter_records(data, offsets=None):
+    """
+    Iterate over the records in a capture.
+
+    Parameters
+    ----------
+    data : bytes
+        The whole capture, or a :func:`map_file` of it.
+    offsets : list of int
+        The offsets of the records to read, as found by :func:`scan`. Defaults
+        to every record.
+
+    Yields
+    ------
+    Time : float
+    Data : bytes
+    """
+
+    if offsets is None:
+        offsets = scan(data)
+
+    for offset in offsets:
+        time, length = _record.unpack_from(data, offset)
+        start = offset + _record.size
+        yield time, bytes(data[start:start + length])
+
+
+def map_file(fd):
+    """
+    Map a capture file into memory, so it can be read without loading it all.
+
+    Parameters
+    ----------
+    fd : file
+        A capture file opened for reading in binary mode.
+
+    Returns
+    -------
+    mmap.mmap
+    """
+
+    try:
+        return mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        raise ValueError('Not an X-Plane capture.')
+
+
+def read(path):
+    """
+    Read every record in a capture file.
+
+    Yields
+    ------
+    Time : float
+    Data : bytes
+    """
+
+    with open(path, 'rb') as fd, map_file(fd) as data:
+        yield from iter_records(data)
@@ -1,15 +1,16 @@
 import asyncio
 
 import xplane.autopilot
+import xplane.filters
 import xplane.io
 
 
 class MyProtocol(xplane.io.Protocol, xplane.autopilot.TakeoffMixin):
     def __init__(self, remote_addr):
-        super().__init__(remote_addr)
+        super().__init__(remote_addr, filters=xplane.filters.FilterStage())
 
     def got_data_packet(self, packet, address):
-        self.take_off_got_data_packet(packet, address)
+        self.takeoff_got_data_packet(packet, address)
 
 
 def mainloop(local_addr, remote_addr, action):
@@ -1,68 +1,121 @@
 import asyncio
 import curses
 import socket
+import time
 
+import numpy as np
+
+import xplane.history
 import xplane.io
 
 
+SPARKS = ' ▁▂▃▄▅▆▇█'
+
+
+def sparkline(values, width):
+    """Draw values as a line of block characters, at most `width` long."""
+
+    if len(values) == 0:
+        return ''
+
+    buckets = np.array_split(values, min(width, len(values)))
+    means = np.array([bucket.mean() for bucket in buckets])
+
+    low, high = means.min(), means.max()
+    if high == low:
+        levels = np.full(len(means), len(SPARKS) // 2)
+    else:
+        levels = 1 + ((means - low) / (high - low) * (len(SPARKS) - 2)) \
+            .round().astype(int)
+
+    return ''.join(SPARKS[level] for level in levels)
+
+
 class MyProtocol(xplane.io.Protocol):
+    sparkline_duration = 10
+    sparkline_width = 25
+
     def __init__(self, window):
         super().__init__()
 
         self.window = window
+        self.history = None
 
         curses.init_pair(1, curses.COLOR_WHITE, curses.COLOR_BLACK)
         curses.init_pair(2, curses.COLOR_GREEN, curses.COLOR_BLACK)
 
-    def show_value(self, y, x, name, value, d=2):
+    def show_value(self, y, x, name, value, d=2, source=None):
         self.window.addstr(y, x, name, curses.color_pair(2))
         self.window.addstr(y, x + len(name) + 1, str(round(value, d)), curses.color_pair(1))
 
+        if source is not None and self.history is not None:
+            index, position = source
+            _, values = self.history.range(
+                index, time.monotonic() - self.sparkline_duration)
+            line = sparkline(values[:, position], self.sparkline_width)
+            self.window.addstr(y + 1, x, line, curses.color_pair(1))
+
+    def _record(self, packet):
+        # The history holds a number of samples, so it is sized from the rate
+        # packets are arriving at, and made bigger if they speed up.
+        rate = self.observed_rate
+        if rate is None:
+            return
+
+        if self.history is None or rate > self.history.rate:
+            self.history = xplane.history.History(
+                duration=self.sparkline_duration, rate=rate, levels=())
+
+        self.history.append(packet)
+
     def got_data_packet(self, packet, address):
+        self._record(packet)
+
         self.window.clear()
 
         try:
             _, _, true_airspeed, _ = packet.read_speeds()
-            self.show_value(1, 1, 'Speed', true_airspeed)
+            self.show_value(1, 1, 'Speed', true_airspeed, source=(3, 2))
         except IndexError:
             pass
 
         try:
             L, M, N = packet.read_angular_moments()
-            self.show_value(3, 1, 'M', M)
-            self.show_value(3, 31, 'L', L)
-            self.show_value(3, 61, 'N', N)
+            self.show_value(3, 1, 'M', M, source=(15, 0))
+            self.show_value(3, 31, 'L', L, source=(15, 1))
+            self.show_value(3, 61, 'N', N, source=(15, 2))
         except IndexError:
             pass
 
         try:
             P, Q, R = packet.read_angular_velocities()
-            self.show_value(5, 1, 'P', P)
-            self.show_value(5, 31, 'Q', Q)
-            self.show_value(5, 61, 'R', R)
+            self.show_value(5, 1, 'P', P, source=(16, 1))
+            self.show_value(5, 31, 'Q', Q, source=(16, 0))
+            self.show_value(5, 61, 'R', R, source=(16, 2))
         except IndexError:
             pass
 
         try:
             pitch, roll, true_heading, magnetic_heading \
                 = packet.read_pitch_roll_headings()
-            self.show_value(7, 1, 'Pitch', pitch)
-            self.show_value(7, 31, 'Roll', roll)
-            self.show_value(7, 61, 'Yaw', true_heading)
+            self.show_value(7, 1, 'Pitch', pitch, source=(17, 0))
+            self.show_value(7, 31, 'Roll', roll, source=(17, 1))
+            self.show_value(7, 61, 'Yaw', true_heading, source=(17, 2))
         except IndexError:
             pass
 
         try:
             engine_thrust = packet.read_engine_thrust()
-            self.show_value(9, 1, 'Engine Thrust', engine_thrust)
+            self.show_value(9, 1, 'Engine Thrust', engine_thrust,
+                            source=(35, 0))
         except IndexError:
             pass
 
         try:
             lift, drag, side = packet.read_aero_forces()
-            self.show_value(11, 1, 'Lift', lift)
-            self.show_value(11, 31, 'Drag', drag)
-            self.show_value(11, 61, 'Side', side)
+            self.show_value(11, 1, 'Lift', lift, source=(64, 0))
+            self.show_value(11, 31, 'Drag', drag, source=(64, 1))
+            self.show_value(11, 61, 'Side', side, source=(64, 2))
         except IndexError:
             pass
 
@@ -0,0 +1,405 @@
+import asyncio
+import collections
+import math
+import multiprocessing
+import socket
+import sys
+import time
+
+import numpy as np
+
+import xplane.capture
+import xplane.filters
+import xplane.io
+import xplane.packets
+
+
+# The accessors of a DataPacket which are decoded, and the names of the columns
+# their values go in.
+COLUMNS = [
+    ('read_speeds', ('indicated_airspeed', 'equivalent_airspeed',
+                     'true_airspeed', 'groundspeed')),
+    ('read_angular_moments', ('L', 'M', 'N')),
+    ('read_angular_velocities', ('P', 'Q', 'R')),
+    ('read_pitch_roll_headings', ('pitch', 'roll', 'true_heading',
+                                  'magnetic_heading')),
+    ('read_latitude_longitude_altitude', ('latitude', 'longitude',
+                                          'mean_sea_level_altitude',
+                                          'above_ground_level_altitude')),
+    ('read_engine_thrust', ('engine_thrust',)),
+    ('read_aero_forces', ('lift', 'drag', 'side')),
+    ('read_aileron_angle', ('aileron1_left', 'aileron1_right',
+                            'aileron2_left', 'aileron2_right',
+                            'aileron3_left', 'aileron3_right',
+                            'aileron4_left', 'aileron4_right')),
+    ('read_elevator_angle', ('elevator1_left', 'elevator1_right',
+                             'elevator2_left', 'elevator2_right')),
+    ('read_rudder_angle', ('rudder1_left', 'rudder1_right',
+                           'rudder2_left', 'rudder2_right')),
+]
+
+COLUMN_NAMES = [name for _, names in COLUMNS for name in names]
+
+
+def _flatten(values):
+    if isinstance(values, tuple):
+        for value in values:
+            yield from _flatten(value)
+    else:
+        yield getattr(values, 'magnitude', values)
+
+
+def decode_packet(packet):
+    """
+    Decode every column from a packet, in SI units.
+
+    Columns whose index is missing from the packet are NaN.
+
+    Returns
+    -------
+    list of float
+        In the order of :data:`COLUMN_NAMES`.
+    """
+
+    row = []
+
+    for accessor, names in COLUMNS:
+        try:
+            row.extend(_flatten(getattr(packet, accessor)()))
+        except IndexError:
+            row.extend([math.nan] * len(names))
+
+    return row
+
+
+def _decode_chunk(job):
+    path, offsets = job
+
+    times = np.empty(len(offsets))
+    values = np.empty((len(offsets), len(COLUMN_NAMES)))
+    packet = xplane.packets.DataPacket()
+    count = 0
+
+    with open(path, 'rb') as fd, xplane.capture.map_file(fd) as data:
+        for received, datagram in xplane.capture.iter_records(data, offsets):
+            try:
+                packet.read(datagram)
+            except ValueError:
+                continue
+
+            times[count] = received
+            values[count] = decode_packet(packet)
+            count += 1
+
+    return times[:count], values[:count]
+
+
+def decode(path, output, processes=None, chunk_size=10000):
+    """
+    Decode a capture into a NumPy ``.npz`` file with one array per column,
+    spread over multiple processes.
+
+    Parameters
+    ----------
+    path : str
+        The capture file.
+    output : str
+        Where to write the columns.
+    processes : int
+        How many processes to use, defaulting to the number of cores.
+    chunk_size : int
+        How many records each process decodes at a time.
+    """
+
+    with open(path, 'rb') as fd, xplane.capture.map_file(fd) as data:
+        offsets = xplane.capture.scan(data)
+
+    jobs = [(path, offsets[i:i + chunk_size])
+            for i in range(0, len(offsets), chunk_size)]
+
+    with multiprocessing.Pool(processes) as pool:
+        chunks = pool.map(_decode_chunk, jobs)
+
+    times = np.concatenate([np.empty(0)] + [t for t, _ in chunks])
+    values = np.concatenate([np.empty((0, len(COLUMN_NAMES)))]
+                            + [v for _, v in chunks])
+
+    columns = {name: values[:, i] for i, name in enumerate(COLUMN_NAMES)}
+    np.savez(output, time=times, **columns)
+
+    return len(times)
+
+
+class Statistics:
+    """
+    Keeps track of the throughput, loss, jitter and rate of each index of a
+    stream of datagrams.
+
+    X-Plane doesn't number its packets, so loss is estimated from gaps longer
+    than the typical interval between packets. This misses packets lost
+    without leaving a gap, so it is a lower bound.
+
+    Parameters
+    ----------
+    window : int
+        How many of the most recent intervals to estimate loss and jitter
+        from.
+    """
+
+    def __init__(self, window=10000):
+        self.packets = 0
+        self.bytes = 0
+        self.lost = 0
+        self.first_time = None
+        self.last_time = None
+        self.index_counts = collections.Counter()
+
+        self.intervals = xplane.filters.RingBuffer(window)
+        self._typical_interval = None
+        self._packet = xplane.packets.DataPacket()
+
+    def add(self, time, data):
+        """
+        Add a datagram.
+
+        Parameters
+        ----------
+        time : float
+            When the datagram was received, in seconds.
+        data : bytes
+            The raw bytes in the datagram.
+        """
+
+        if self.last_time is not None:
+            interval = time - self.last_time
+            self.intervals.append(interval)
+
+            if self._typical_interval is None:
+                if len(self.intervals) >= 16:
+                    # Count the gaps between the packets seen before there
+                    # were enough intervals to know what a gap was.
+                    intervals = self.intervals.ordered()
+                    self._typical_interval = np.median(intervals)
+                    self.lost += self._count_lost(intervals)
+            else:
+                if self.packets % 256 == 0:
+                    self._typical_interval = \
+                        np.median(self.intervals.ordered())
+                self.lost += self._count_lost(interval)
+        else:
+            self.first_time = time
+
+        self.last_time = time
+        self.packets += 1
+        self.bytes += len(data)
+
+        try:
+            self._packet.read(data)
+        except ValueError:
+            return
+
+        self.index_counts.update(self._packet.data.keys())
+
+    def _count_lost(self, intervals):
+        typical = self._typical_interval
+        if not typical:
+            return 0
+
+        intervals = np.asarray(intervals)
+        gaps = intervals[intervals > 1.5 * typical]
+        return int((np.round(gaps / typical) - 1).sum())
+
+    @property
+    def duration(self):
+        if self.first_time is None:
+            return 0.0
+        return self.last_time - self.first_time
+
+    def report(self):
+        """
+        Describe the statistics.
+
+        Returns
+        -------
+        str
+        """
+
+        duration = self.duration
+        rate = self.packets / duration if duration else 0.0
+        expected = self.packets + self.lost
+        loss = self.lost / expected * 100 if expected else 0.0
+
+        intervals = self.intervals.ordered()
+        if len(intervals):
+            mean_interval = intervals.mean() * 1000
+            jitter = intervals.std() * 1000
+        else:
+            mean_interval = jitter = 0.0
+
+        lines = [
+            'Packets: {} in {:.2f} s'.format(self.packets, duration),
+            'Throughput: {:.1f} packets/s, {:.1f} kB/s'
+            .format(rate, self.bytes / duration / 1000 if duration else 0.0),
+            'Loss: at least {} packets ({:.2f}%, estimated from gaps)'
+            .format(self.lost, loss),
+            'Interval: {:.2f} ms, jitter {:.2f} ms'
+            .format(mean_interval, jitter),
+        ]
+
+        for index, count in sorted(self.index_counts.items()):
+            lines.append('Index {:3}: {:.1f} /s'
+                         .format(index, count / duration if duration else 0.0))
+
+        return '\n'.join(lines)
+
+
+class CaptureProtocol(xplane.io.Protocol):
+    """
+    Writes every datagram to a capture.
+
+    Only the number of datagrams and bytes are counted as they arrive, to keep
+    up at line rate; the ``stats`` command gives the rest from the capture.
+    """
+
+    def __init__(self, writer):
+        super().__init__()
+
+        self.writer = writer
+        self.packets = 0
+        self.bytes = 0
+        self.started = time.time()
+
+    def datagram_received(self, data, address):
+        self.writer.write(time.time(), data)
+        self.packets += 1
+        self.bytes += len(data)
+
+    def report(self):
+        duration = time.time() - self.started
+        return 'Captured {} packets, {} bytes in {:.2f} s' \
+            .format(self.packets, self.bytes, duration)
+
+
+class StatisticsProtocol(xplane.io.Protocol):
+    """
+    Adds every datagram to statistics as it arrives.
+
+    Datagrams are timed with a monotonic clock, so intervals aren't thrown
+    off by the system clock being adjusted. Captures are timed since the
+    epoch instead, so that they can be matched up with other records.
+    """
+
+    def __init__(self, statistics):
+        super().__init__()
+
+        self.statistics = statistics
+
+    def datagram_received(self, data, address):
+        self.statistics.add(time.monotonic(), data)
+
+    def report(self):
+        return self.statistics.report()
+
+
+def mainloop(address, protocol_factory, interval=None, duration=None,
+             receive_buffer=None):
+    loop = asyncio.get_event_loop()
+    connect = loop.create_datagram_endpoint(protocol_factory,
+                                            local_addr=address)
+    transport, protocol = loop.run_until_complete(connect)
+
+    # A bigger buffer gives more time to catch up after a pause, such as
+    # writing to disk, before the kernel starts dropping datagrams.
+    if receive_buffer is not None:
+        transport.get_extra_info('socket').setsockopt(
+            socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+
+    def show_report():
+        print(protocol.report(), end='\n\n', file=sys.stderr)
+        loop.call_later(interval, show_report)
+
+    if interval is not None:
+        loop.call_later(interval, show_report)
+
+    if duration is not None:
+        loop.call_later(duration, loop.stop)
+
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+    transport.close()
+    loop.close()
+
+    print(protocol.report(), file=sys.stderr)
+
+
+def capture(args):
+    with open(args.output, 'wb') as fd:
+        writer = xplane.capture.CaptureWriter(fd)
+        mainloop((args.bind, args.port), lambda: CaptureProtocol(writer),
+                 args.interval, args.duration, args.receive_buffer)
+
+
+def decode_capture(args):
+    count = decode(args.capture, args.output, args.processes)
+    print('Decoded {} packets.'.format(count), file=sys.stderr)
+
+
+def stats(args):
+    statistics = Statistics()
+
+    if args.capture is None:
+        mainloop((args.bind, args.port),
+                 lambda: StatisticsProtocol(statistics), args.interval,
+                 args.duration, args.receive_buffer)
+    else:
+        for received, data in xplane.capture.read(args.capture):
+            statistics.add(received, data)
+        print(statistics.report())
+
+
+def main():
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    def add_listen_arguments(subparser):
+        subparser.add_argument('-b', '--bind', type=str, default='::')
+        subparser.add_argument('-p', '--port', type=int, default=49000)
+        subparser.add_argument('-i', '--interval', type=float, default=None,
+                               help='seconds between printing statistics')
+        subparser.add_argument('-d', '--duration', type=float, default=None,
+                               help='seconds to stop listening after')
+        subparser.add_argument('-r', '--receive-buffer', type=int,
+                               default=8 * 1024 * 1024,
+                               help='bytes of socket receive buffer')
+
+    capture_parser = subparsers.add_parser(
+        'capture', help='capture raw datagrams to a file')
+    capture_parser.add_argument('output', type=str)
+    add_listen_arguments(capture_parser)
+    capture_parser.set_defaults(function=capture)
+
+    decode_parser = subparsers.add_parser(
+        'decode', help='decode a capture into a .npz file of columns')
+    decode_parser.add_argument('capture', type=str)
+    decode_parser.add_argument('output', type=str)
+    decode_parser.add_argument('-j', '--processes', type=int, default=None)
+    decode_parser.set_defaults(function=decode_capture)
+
+    stats_parser = subparsers.add_parser(
+        'stats', help='show statistics of a capture, or of a live stream')
+    stats_parser.add_argument('capture', type=str, nargs='?', default=None)
+    add_listen_arguments(stats_parser)
+    stats_parser.set_defaults(function=stats)
+
+    args = parser.parse_args()
+    args.function(args)
+
+
+if __name__ == '__main__':
+    main()
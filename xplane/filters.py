@@ -0,0 +1,524 @@
+"""
+Incremental signal filters for smoothing values received from X-Plane.
+
+Every filter can be updated one sample at a time in constant time, for use in
+a live control loop, or applied to whole arrays at once, for replaying
+recorded data. Filters operate on the raw values found in a
+:class:`xplane.packets.DataPacket`, before any unit conversion.
+"""
+
+import math
+from time import monotonic
+
+import numpy as np
+
+
+def _linear_recurrence(decay, inputs, initial):
+    """
+    Evaluate ``y[n] = decay * y[n - 1] + inputs[n]`` for a whole array.
+
+    The recurrence is unrolled into a cumulative sum, in blocks short enough
+    that ``decay ** -n`` can't overflow.
+    """
+
+    inputs = np.asarray(inputs, dtype=np.float64)
+    outputs = np.empty_like(inputs)
+
+    if decay == 0:
+        outputs[:] = inputs
+        return outputs
+
+    block = max(1, int(-100 / math.log10(decay))) if decay < 1 \
+        else len(inputs)
+
+    previous = initial
+    for start in range(0, len(inputs), block):
+        chunk = inputs[start:start + block]
+        powers = decay ** np.arange(1, len(chunk) + 1)
+        outputs[start:start + len(chunk)] = \
+            powers * (previous + np.cumsum(chunk / powers))
+        previous = outputs[start + len(chunk) - 1]
+
+    return outputs
+
+
+def _wrap(difference, period):
+    """Wrap a difference between angles into ``[-period / 2, period / 2)``."""
+
+    return (difference + period / 2) % period - period / 2
+
+
+def _unwrap(values, period, reference):
+    """
+    Unwrap an array of angles, so that each is within half a period of the
+    one before, starting from `reference`.
+    """
+
+    steps = _wrap(np.diff(np.concatenate(([reference], values))), period)
+    return reference + np.cumsum(steps)
+
+
+class RingBuffer:
+    """
+    A fixed-size buffer of floats which overwrites its oldest value.
+
+    Parameters
+    ----------
+    size : int
+        The number of values the buffer holds.
+    """
+
+    def __init__(self, size):
+        if size < 1:
+            raise ValueError('Ring buffer size must be positive, not {}.'
+                             .format(size))
+
+        self.values = np.zeros(size)
+        self.head = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):
+        """
+        Add a value, returning the one it replaced (or ``None``).
+        """
+
+        size = len(self.values)
+        old = self.values[self.head] if self.count == size else None
+
+        self.values[self.head] = value
+        self.head = (self.head + 1) % size
+        self.count = min(self.count + 1, size)
+
+        return old
+
+    def __getitem__(self, age):
+        """
+        Get a value by age, where ``0`` is the most recent value.
+
+        Raises
+        ------
+        IndexError
+            If the buffer doesn't hold a value that old.
+        """
+
+        if not 0 <= age < self.count:
+            raise IndexError('Ring buffer does not contain age {}.'
+                             .format(age))
+
+        return self.values[(self.head - 1 - age) % len(self.values)]
+
+    def ordered(self):
+        """
+        Get the held values, oldest first.
+
+        Returns
+        -------
+        numpy.ndarray
+        """
+
+        return np.roll(self.values, -self.head)[len(self.values) - self.count:]
+
+    def extend(self, values):
+        """Add an array of values, as if :meth:`append` was called on each."""
+
+        size = len(self.values)
+        values = np.asarray(values, dtype=np.float64)[-size:]
+
+        positions = (self.head + np.arange(len(values))) % size
+        self.values[positions] = values
+        self.head = (self.head + len(values)) % size
+        self.count = min(self.count + len(values), size)
+
+
+class LowPassFilter:
+    """
+    A first order low-pass filter (an exponential moving average).
+
+    Parameters
+    ----------
+    alpha : float
+        How much weight each new sample gets, between 0 and 1.
+    period : float
+        For angles, such as headings, the value at which they wrap around
+        (e.g. ``360``). The output is then kept within ``[0, period)``.
+    """
+
+    def __init__(self, alpha, period=None):
+        if not 0 < alpha <= 1:
+            raise ValueError('Alpha must be in (0, 1], not {}.'.format(alpha))
+
+        self.alpha = alpha
+        self.period = period
+        self.value = None
+
+    def update(self, time, value):
+        if self.value is None:
+            self.value = value
+        else:
+            error = value - self.value
+            if self.period is not None:
+                error = _wrap(error, self.period)
+            self.value += self.alpha * error
+
+        if self.period is not None:
+            self.value %= self.period
+
+        return self.value
+
+    def apply(self, times, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return values
+
+        initial = values[0] if self.value is None else self.value
+        if self.period is not None:
+            values = _unwrap(values, self.period, initial)
+
+        outputs = _linear_recurrence(1 - self.alpha, self.alpha * values,
+                                     initial)
+        if self.period is not None:
+            outputs %= self.period
+
+        self.value = float(outputs[-1])
+        return outputs
+
+
+class MovingAverageFilter:
+    """
+    The mean of the most recent samples.
+
+    Parameters
+    ----------
+    size : int
+        The number of samples to average over.
+    period : float
+        For angles, such as headings, the value at which they wrap around
+        (e.g. ``360``). The output is then kept within ``[0, period)``.
+    """
+
+    def __init__(self, size, period=None):
+        self.buffer = RingBuffer(size)
+        self.total = 0.0
+        self.period = period
+
+        # The rounding error lost from the running total, using Neumaier's
+        # compensated summation.
+        self._compensation = 0.0
+
+        # The last value, unwrapped so the buffer holds no jumps of a period.
+        self._last = None
+
+    def _resum(self, values):
+        self.total = math.fsum(values)
+        self._compensation = math.fsum(np.append(values, -self.total))
+
+    def _add(self, value):
+        total = self.total + value
+        if abs(self.total) >= abs(value):
+            self._compensation += (self.total - total) + value
+        else:
+            self._compensation += (value - total) + self.total
+        self.total = total
+
+    def _mean(self, total, count):
+        mean = total / count
+        if self.period is not None:
+            mean %= self.period
+        return mean
+
+    def update(self, time, value):
+        if self.period is not None:
+            if self._last is not None:
+                value = self._last + _wrap(value - self._last, self.period)
+            self._last = value
+
+        old = self.buffer.append(value)
+
+        # Summing afresh once per lap of the buffer stops rounding errors in
+        # the running total from building up.
+        if self.buffer.head == 0:
+            self._resum(self.buffer.values)
+        else:
+            self._add(value)
+            if old is not None:
+                self._add(-old)
+
+        return self._mean(self.total + self._compensation, len(self.buffer))
+
+    def apply(self, times, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return values
+
+        if self.period is not None:
+            reference = values[0] if self._last is None else self._last
+            values = _unwrap(values, self.period, reference)
+            self._last = float(values[-1])
+
+        size = len(self.buffer.values)
+        history = self.buffer.ordered()
+        combined = np.concatenate((history, values))
+        sums = np.concatenate(([0.0], np.cumsum(combined)))
+
+        ends = np.arange(len(history) + 1, len(combined) + 1)
+        starts = np.maximum(ends - size, 0)
+        outputs = self._mean(sums[ends] - sums[starts], ends - starts)
+
+        self.buffer.extend(values)
+        self._resum(self.buffer.ordered())
+
+        return outputs
+
+
+class DerivativeFilter:
+    """
+    The rate of change of a value, per second.
+
+    The first sample has a derivative of zero.
+
+    Parameters
+    ----------
+    span : int
+        How many samples back to difference against, trading latency for
+        less noise.
+    """
+
+    def __init__(self, span=1):
+        if span < 1:
+            raise ValueError('Span must be at least 1, not {}.'.format(span))
+
+        self.times = RingBuffer(span + 1)
+        self.values = RingBuffer(span + 1)
+
+    def update(self, time, value):
+        self.times.append(time)
+        self.values.append(value)
+
+        oldest = len(self.times) - 1
+        if oldest == 0:
+            return 0.0
+
+        delta_time = time - self.times[oldest]
+        if delta_time <= 0:
+            return 0.0
+
+        return (value - self.values[oldest]) / delta_time
+
+    def apply(self, times, values):
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return values
+
+        span = len(self.times.values) - 1
+        all_times = np.concatenate((self.times.ordered(), times))
+        all_values = np.concatenate((self.values.ordered(), values))
+
+        ends = np.arange(len(all_times) - len(times), len(all_times))
+        starts = np.maximum(ends - span, 0)
+        delta_times = all_times[ends] - all_times[starts]
+
+        outputs = np.zeros(len(values))
+        valid = delta_times > 0
+        outputs[valid] = (all_values[ends] - all_values[starts])[valid] \
+            / delta_times[valid]
+
+        self.times.extend(times)
+        self.values.extend(values)
+
+        return outputs
+
+
+class ComplementaryFilter:
+    """
+    Fuse an absolute measurement with its rate of change, such as the true
+    heading (index 17, in degrees) with ``period=360`` and the yaw rate (index
+    16, in radians per second) with ``rate_scale=math.degrees(1)``.
+
+    The rate is integrated for responsiveness, while the measurement corrects
+    for the drift this introduces.
+
+    Parameters
+    ----------
+    alpha : float
+        How much to trust the integrated rate over the measurement, between 0
+        and 1.
+    period : float
+        For angles, the value at which the measurement wraps around. The
+        output is then kept within ``[0, period)``.
+    rate_scale : float
+        What to multiply the rate by to get it in the units of the measurement
+        per second.
+    """
+
+    def __init__(self, alpha=0.98, period=None, rate_scale=1.0):
+        if not 0 <= alpha < 1:
+            raise ValueError('Alpha must be in [0, 1), not {}.'.format(alpha))
+
+        self.alpha = alpha
+        self.period = period
+        self.rate_scale = rate_scale
+        self.value = None
+        self.time = None
+
+    def update(self, time, measurement, rate):
+        if self.value is None:
+            self.value = measurement
+        else:
+            predicted = self.value \
+                + rate * self.rate_scale * (time - self.time)
+            error = measurement - predicted
+            if self.period is not None:
+                error = _wrap(error, self.period)
+            self.value = predicted + (1 - self.alpha) * error
+
+        if self.period is not None:
+            self.value %= self.period
+
+        self.time = time
+        return self.value
+
+    def apply(self, times, measurements, rates):
+        times = np.asarray(times, dtype=np.float64)
+        measurements = np.asarray(measurements, dtype=np.float64)
+        rates = np.asarray(rates, dtype=np.float64) * self.rate_scale
+        if len(times) == 0:
+            return times
+
+        if self.period is not None:
+            reference = measurements[0] if self.value is None else self.value
+            measurements = _unwrap(measurements, self.period, reference)
+
+        if self.value is None:
+            initial = measurements[0]
+            previous_times = np.concatenate(([times[0]], times[:-1]))
+        else:
+            initial = self.value
+            previous_times = np.concatenate(([self.time], times[:-1]))
+
+        inputs = self.alpha * rates * (times - previous_times) \
+            + (1 - self.alpha) * measurements
+        if self.value is None:
+            inputs[0] = (1 - self.alpha) * measurements[0]
+
+        outputs = _linear_recurrence(self.alpha, inputs, initial)
+        if self.period is not None:
+            outputs %= self.period
+
+        self.value = float(outputs[-1])
+        self.time = float(times[-1])
+        return outputs
+
+
+class FilterStage:
+    """
+    Filters values out of every received packet, so the results can be shared
+    between consumers.
+
+    Each channel has a name, a filter and the sources of its inputs, given as
+    ``(index, position)`` pairs into a :class:`xplane.packets.DataPacket`.
+    """
+
+    def __init__(self):
+        self.channels = {}
+        self.values = {}
+
+    def add(self, name, filter, *sources):
+        """
+        Add a channel.
+
+        Parameters
+        ----------
+        name : str
+            The name the filtered value is read by.
+        filter
+            The filter to run.
+        sources : (int, int)
+            The index and position in the packet of each filter input.
+        """
+
+        self.channels[name] = (filter, sources)
+
+    @property
+    def indices(self):
+        """The packet indices read by any channel."""
+
+        return {index for _, sources in self.channels.values()
+                for index, _ in sources}
+
+    def remove(self, name):
+        """Remove a channel, and its last value."""
+
+        del self.channels[name]
+        self.values.pop(name, None)
+
+    def feed(self, packet, time=None):
+        """
+        Update every channel whose inputs are all in a packet.
+
+        Parameters
+        ----------
+        packet : xplane.packets.DataPacket
+            The received packet.
+        time : float
+            When the packet was received, in seconds. Defaults to now.
+        """
+
+        if time is None:
+            time = monotonic()
+
+        for name, (filter, sources) in self.channels.items():
+            try:
+                inputs = [packet.data[index][position]
+                          for index, position in sources]
+            except KeyError:
+                continue
+
+            self.values[name] = filter.update(time, *inputs)
+
+    def replay(self, times, columns):
+        """
+        Run every channel over recorded data in one go.
+
+        Parameters
+        ----------
+        times : numpy.ndarray
+            When each sample was received, in seconds.
+        columns : dict
+            Arrays of samples, keyed by ``(index, position)``.
+
+        Returns
+        -------
+        dict
+            The filtered arrays, keyed by channel name.
+        """
+
+        outputs = {}
+
+        for name, (filter, sources) in self.channels.items():
+            try:
+                inputs = [columns[source] for source in sources]
+            except KeyError:
+                continue
+
+            outputs[name] = filter.apply(times, *inputs)
+            if len(outputs[name]):
+                self.values[name] = float(outputs[name][-1])
+
+        return outputs
+
+    def __getitem__(self, name):
+        """
+        Get the latest filtered value of a channel.
+
+        Raises
+        ------
+        KeyError
+            If the channel hasn't received any data yet.
+        """
+
+        return self.values[name]
+
@@ -0,0 +1,280 @@
+"""
+A fixed-size history of the values received from X-Plane.
+
+Recent values are kept at full resolution, while older values are summarised
+into buckets of increasing width, so memory use doesn't grow however long the
+flight is.
+"""
+
+from time import monotonic
+
+import numpy as np
+
+
+class _MirroredBuffer:
+    """
+    A ring buffer which writes every row twice, so the most recent rows are
+    always a contiguous slice and can be returned without copying.
+    """
+
+    def __init__(self, capacity, shape=(), dtype=np.float64):
+        self.capacity = capacity
+        self.rows = np.zeros((capacity * 2,) + shape, dtype=dtype)
+        self.head = -1
+        self.count = 0
+
+    def append(self, row):
+        self.head = (self.head + 1) % self.capacity
+        self.rows[self.head] = row
+        self.rows[self.head + self.capacity] = row
+        self.count = min(self.count + 1, self.capacity)
+
+    def view(self):
+        end = self.head + self.capacity + 1
+        return self.rows[end - self.count:end]
+
+
+def _time_slice(times, start, end):
+    left = 0 if start is None else np.searchsorted(times, start, 'left')
+    right = len(times) if end is None \
+        else np.searchsorted(times, end, 'right')
+    return slice(left, right)
+
+
+class Level:
+    """
+    Older values summarised into buckets of a fixed width.
+
+    Parameters
+    ----------
+    width : float
+        The width of each bucket, in seconds.
+    capacity : int
+        How many buckets to keep.
+    """
+
+    def __init__(self, width, capacity):
+        self.width = width
+
+        self._times = _MirroredBuffer(capacity)
+        self._minimum = _MirroredBuffer(capacity, (8,), np.float32)
+        self._maximum = _MirroredBuffer(capacity, (8,), np.float32)
+        self._mean = _MirroredBuffer(capacity, (8,), np.float32)
+
+        self._bucket = None
+        self._bucket_minimum = np.empty(8)
+        self._bucket_maximum = np.empty(8)
+        self._bucket_total = np.empty(8)
+        self._bucket_count = 0
+
+    def add(self, time, values):
+        bucket = int(time // self.width)
+
+        if bucket != self._bucket:
+            self._close_bucket()
+            self._bucket = bucket
+            self._bucket_minimum[:] = values
+            self._bucket_maximum[:] = values
+            self._bucket_total[:] = values
+            self._bucket_count = 1
+        else:
+            np.minimum(self._bucket_minimum, values,
+                       out=self._bucket_minimum)
+            np.maximum(self._bucket_maximum, values,
+                       out=self._bucket_maximum)
+            self._bucket_total += values
+            self._bucket_count += 1
+
+    def _close_bucket(self):
+        if self._bucket is None:
+            return
+
+        self._times.append(self._bucket * self.width)
+        self._minimum.append(self._bucket_minimum)
+        self._maximum.append(self._bucket_maximum)
+        self._mean.append(self._bucket_total / self._bucket_count)
+
+    def range(self, start=None, end=None):
+        """
+        Get the closed buckets starting between two times.
+
+        Parameters
+        ----------
+        start : float
+            The earliest time, or ``None`` for the oldest bucket.
+        end : float
+            The latest time, or ``None`` for the newest bucket.
+
+        Returns
+        -------
+        Times : numpy.ndarray
+            When each bucket starts, shape ``(n,)``.
+        Minimum : numpy.ndarray
+            Shape ``(n, 8)``.
+        Maximum : numpy.ndarray
+            Shape ``(n, 8)``.
+        Mean : numpy.ndarray
+            Shape ``(n, 8)``.
+        """
+
+        times = self._times.view()
+        selected = _time_slice(times, start, end)
+
+        return times[selected], self._minimum.view()[selected], \
+            self._maximum.view()[selected], self._mean.view()[selected]
+
+
+class Series:
+    """
+    The history of the values at a single index.
+
+    Parameters
+    ----------
+    capacity : int
+        How many values to keep at full resolution.
+    levels : list of (float, int)
+        The width in seconds and the number of buckets of each summarised
+        level.
+    """
+
+    def __init__(self, capacity, levels):
+        self._times = _MirroredBuffer(capacity)
+        self._values = _MirroredBuffer(capacity, (8,), np.float32)
+        self.levels = [Level(width, count) for width, count in levels]
+
+    def append(self, time, values):
+        self._times.append(time)
+        self._values.append(values)
+
+        for level in self.levels:
+            level.add(time, values)
+
+    def range(self, start=None, end=None):
+        """
+        Get the full resolution values received between two times.
+
+        The returned arrays are views, which are only valid until the next
+        value is appended.
+
+        Parameters
+        ----------
+        start : float
+            The earliest time, or ``None`` for the oldest value.
+        end : float
+            The latest time, or ``None`` for the newest value.
+
+        Returns
+        -------
+        Times : numpy.ndarray
+            Shape ``(n,)``.
+        Values : numpy.ndarray
+            Shape ``(n, 8)``.
+        """
+
+        times = self._times.view()
+        selected = _time_slice(times, start, end)
+
+        return times[selected], self._values.view()[selected]
+
+
+class History:
+    """
+    The history of every index received in a 'DATA' packet.
+
+    Parameters
+    ----------
+    duration : float
+        How many seconds of values to keep at full resolution, when they are
+        received at `rate`.
+    rate : float
+        The number of packets per second X-Plane sends, such as the negotiated
+        or observed rate of a :class:`xplane.io.Protocol`. The full resolution
+        values are kept as a number of samples, ``duration * rate``, so they
+        cover less time if packets arrive faster than this.
+    levels : list of (float, int)
+        The width in seconds and the number of buckets of each summarised
+        level. By default, second buckets for an hour and minute buckets for
+        a day.
+
+    Each index received takes :attr:`bytes_per_index` of memory, as soon as it
+    is first received. Every row is stored twice, so that it can be returned
+    without copying, so this is ``capacity * 80`` bytes for the full
+    resolution values and ``count * 208`` bytes for each level, or about
+    1.1 MB with the defaults.
+    """
+
+    def __init__(self, duration=60, rate=20,
+                 levels=((1, 60 * 60), (60, 24 * 60))):
+        self.duration = duration
+        self.rate = rate
+        self.capacity = int(duration * rate)
+        if self.capacity < 1:
+            raise ValueError('History must hold at least one value, not {}.'
+                             .format(self.capacity))
+
+        for width, count in levels:
+            if width <= 0 or count < 1:
+                raise ValueError('Invalid level of {} buckets of {} s.'
+                                 .format(count, width))
+
+        self.levels = levels
+        self.series = {}
+
+    @property
+    def bytes_per_index(self):
+        """The memory used by the history of each index received."""
+
+        # A time and eight values for each row, twice over, and for levels
+        # the minimum, maximum and mean of each value.
+        full = self.capacity * 2 * (8 + 8 * 4)
+        levels = sum(count * 2 * (8 + 3 * 8 * 4) for _, count in self.levels)
+        return full + levels
+
+    def append(self, packet, time=None):
+        """
+        Add the values in a packet.
+
+        Parameters
+        ----------
+        packet : xplane.packets.DataPacket
+            The received packet.
+        time : float
+            When the packet was received, in seconds. Defaults to now.
+        """
+
+        if time is None:
+            time = monotonic()
+
+        for index, values in packet.data.items():
+            self[index].append(time, values)
+
+    def __getitem__(self, index):
+        """
+        Get the series for an index, creating it if needed.
+
+        Returns
+        -------
+        Series
+        """
+
+        try:
+            return self.series[index]
+        except KeyError:
+            series = Series(self.capacity, self.levels)
+            self.series[index] = series
+            return series
+
+    def range(self, index, start=None, end=None):
+        """
+        Get the full resolution values of an index between two times.
+
+        See :meth:`Series.range`. An index which has never been received gives
+        empty arrays.
+        """
+
+        try:
+            series = self.series[index]
+        except KeyError:
+            return np.empty(0), np.empty((0, 8), dtype=np.float32)
+
+        return series.range(start, end)
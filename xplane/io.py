@@ -2,29 +2,243 @@
 A thin layer on top of :mod:`asyncio` for talking with X-Plane over UDP.
 """
 
+from time import monotonic
+
 from . import packets
 
 
 class Protocol:
-    """The X-Plane UDP protocol."""
+    """
+    The X-Plane UDP protocol.
+
+    Parameters
+    ----------
+    send_address : (host, port)
+        Where to send packets to.
+    filters : xplane.filters.FilterStage
+        Fed with every 'DATA' packet before :meth:`got_data_packet` is called,
+        so filtered values can be shared between consumers.
+
+    Consumers tell the protocol which indices they need with
+    :meth:`subscribe`. While any consumer or filter needs an index, X-Plane is
+    asked to only send the needed indices, at the fastest rate any consumer
+    asked for. Once none are needed, the indices X-Plane was sending and the
+    rate it was sending them at beforehand are put back.
+
+    Received packets are reused once :meth:`got_data_packet` returns, so
+    consumers which keep hold of a packet must
+    :meth:`~xplane.packets.DataPacket.copy` it. Packets to send can be borrowed
+    from the :attr:`data_packets` and :attr:`command_packets` pools.
+    """
 
-    def __init__(self, send_address=None):
+    rate_dataref = 'sim/network/dataout/network_data_rate'
+
+    def __init__(self, send_address=None, filters=None):
         self.send_address = send_address
+        self.filters = filters
+        self.transport = None
+
+        self.data_packets = packets.PacketPool(packets.DataPacket)
+        self._received_packets = packets.PacketPool(packets.DataPacket,
+                                                    reset=False)
+        self.command_packets = packets.PacketPool(packets.CommandPacket)
+
+        self.subscriptions = {}
+        self._negotiating = False
+        self._selected = set()
+        self._unselected = set()
+        self._rate = None
+
+        # What X-Plane was set up to send before negotiating, to put back
+        # afterwards.
+        self._original_indices = set()
+        self._original_rate = None
+        self._last_received = None
+        self._interval = None
 
     def connection_made(self, transport):
         self.transport = transport
+        self.negotiate()
+
+    def subscribe(self, consumer, indices, rate=None):
+        """
+        Ask for indices to be sent, replacing any previous subscription by the
+        same consumer.
+
+        Parameters
+        ----------
+        consumer
+            Anything hashable identifying the consumer.
+        indices : iterable of int
+            The indices the consumer reads.
+        rate : float
+            How many packets per second the consumer wants, or ``None`` if it
+            doesn't mind. This is taken as declared, rather than measured from
+            how fast the consumer handles packets.
+        """
+
+        self.subscriptions[consumer] = (frozenset(indices), rate)
+        self.negotiate()
+
+    def unsubscribe(self, consumer):
+        """
+        Stop asking for the indices a consumer subscribed to, unless another
+        consumer still needs them.
+        """
+
+        if self.subscriptions.pop(consumer, None) is not None:
+            self.negotiate()
+
+    @property
+    def wanted_indices(self):
+        """The indices needed by the subscribed consumers and filters."""
+
+        indices = set()
+        for consumer_indices, _ in self.subscriptions.values():
+            indices |= consumer_indices
+
+        if self.filters is not None:
+            indices |= self.filters.indices
+
+        return indices
+
+    @property
+    def wanted_rate(self):
+        """The fastest rate declared by a subscribed consumer, if any."""
+
+        rates = [rate for _, rate in self.subscriptions.values()
+                 if rate is not None]
+        return max(rates) if rates else None
+
+    def negotiate(self):
+        """
+        Select and unselect indices and set the output rate of X-Plane to match
+        the current subscriptions and filters.
+
+        This is called whenever a consumer subscribes or unsubscribes, and
+        should be called after changing :attr:`filters`.
+        """
+
+        if self.transport is None or self.send_address is None:
+            return
+
+        wanted = self.wanted_indices
+        if not wanted:
+            if self._negotiating:
+                self._restore()
+            return
+
+        if not self._negotiating:
+            self._negotiating = True
+            # Packets received between negotiations come at the restored
+            # rate, or the one last asked for if it couldn't be restored, so
+            # only the rate measured before the first negotiation is kept.
+            if self._original_rate is None:
+                self._original_rate = self.observed_rate
+
+        select = wanted - self._selected
+        if select:
+            self.send_packet(packets.SelectPacket(sorted(select)))
+
+        unselect = self._selected - wanted
+        if unselect:
+            self.send_packet(packets.UnselectPacket(sorted(unselect)))
+
+        self._selected = wanted
+        self._unselected = (self._unselected | unselect) - wanted
+
+        rate = self.wanted_rate
+        if rate is not None and rate != self._rate:
+            self.send_packet(packets.DatarefPacket(self.rate_dataref, rate))
+            self._rate = rate
+
+    def _restore(self):
+        unselect = self._selected - self._original_indices
+        if unselect:
+            self.send_packet(packets.UnselectPacket(sorted(unselect)))
+
+        if self._original_indices:
+            self.send_packet(
+                packets.SelectPacket(sorted(self._original_indices)))
+
+        # The rate can only be put back if packets arrived before negotiating
+        # to measure it from.
+        if self._rate is not None and self._original_rate is not None:
+            self.send_packet(packets.DatarefPacket(self.rate_dataref,
+                                                   self._original_rate))
+
+        self._negotiating = False
+        self._selected = set()
+        self._unselected = set()
+        self._rate = None
+
+        # Intervals measured while negotiating were at the negotiated rate, so
+        # measure afresh from the next packet.
+        self._last_received = None
+        self._interval = None
+
+    @property
+    def observed_rate(self):
+        """
+        How many packets per second X-Plane is sending, or ``None`` if not
+        enough have been received to tell.
+        """
+
+        if not self._interval:
+            return None
+        return round(1 / self._interval)
+
+    def _observe(self, packet):
+        # Remember what X-Plane sends when left alone.
+        self._original_indices.update(packet.data)
+
+        now = monotonic()
+        if self._last_received is not None:
+            interval = now - self._last_received
+            if self._interval is None:
+                self._interval = interval
+            else:
+                self._interval += 0.1 * (interval - self._interval)
+        self._last_received = now
+
+    def _unselect_unwanted(self, packet):
+        # X-Plane may be sending indices selected from its own user interface,
+        # which no consumer reads.
+        unwanted = None
+        for index in packet.data:
+            if index not in self._selected and index not in self._unselected:
+                if unwanted is None:
+                    unwanted = []
+                unwanted.append(index)
+
+        if unwanted is not None:
+            self.send_packet(packets.UnselectPacket(sorted(unwanted)))
+            self._unselected.update(unwanted)
+            self._original_indices.update(unwanted)
 
     def datagram_received(self, data, address):
-        message_type = data[:4]
-        if message_type == b'DATA':
-            self.got_data_packet(packets.DataPacket(data), address)
+        if data.startswith(b'DATA'):
+            packet = self._received_packets.acquire()
+            try:
+                packet.read(data)
+                if self._negotiating:
+                    self._unselect_unwanted(packet)
+                else:
+                    self._observe(packet)
+                if self.filters is not None:
+                    self.filters.feed(packet)
+                self.got_data_packet(packet, address)
+            finally:
+                self._received_packets.release(packet)
         else:
-            print("Got unknown message type '{}'.".format(message_type))
+            print("Got unknown message type '{}'.".format(data[:4]))
 
     def got_data_packet(self, packet, address):
         """
         Called when a 'DATA' packet is received.
 
+        The packet is reused once this returns.
+
         This is meant to be override by subclasses; the default implementation
         does nothing.
 
@@ -39,4 +253,4 @@ class Protocol:
         pass
 
     def send_packet(self, packet):
-        self.transport.sendto(packet.write(), self.send_address)
+        self.transport.sendto(packet.pack(), self.send_address)
@@ -2,6 +2,7 @@
 
 import socket
 import struct
+import sys
 
 import pint
 
@@ -23,15 +24,57 @@ class DataPacket:
         The raw bytes in the packet, passed to :func:`.read`.
     """
 
+    __slots__ = ('data', '_raw', '_layout', '_packed')
+
+    _row = struct.Struct('<i8f')
+    _index = struct.Struct('<i')
+
     def __init__(self, data=None):
         self.data = {}
 
+        # The buffer received packets are copied into, with views of its
+        # values and indices, and the index at each row of the last packet
+        # read. The values in :attr:`data` are views of the buffer.
+        self._raw = None
+        self._layout = None
+
+        # The buffer :meth:`pack` writes into.
+        self._packed = None
+
         if data is not None:
             self.read(data)
 
+    def reset(self):
+        """Remove all the data, so the packet can be reused."""
+
+        # Unlike clear(), popping the items keeps the dict's table, so filling
+        # the packet again doesn't allocate a new one.
+        while self.data:
+            self.data.popitem()
+        self._layout = None
+
+    def copy(self):
+        """
+        Copy this packet, for keeping hold of a packet which is going to be
+        reused.
+
+        Returns
+        -------
+        DataPacket
+        """
+
+        packet = DataPacket()
+        for index, values in self.data.items():
+            packet.data[index] = tuple(values)
+        return packet
+
     def read(self, data):
         """
-        Parse the data in the packet and read it into this class.
+        Parse the data in the packet and read it into this class, replacing
+        any existing data.
+
+        The values are views of a buffer which is refilled in place when the
+        packet is read again, as long as the new packet has the same indices.
 
         Parameters
         ----------
@@ -42,17 +85,41 @@ class DataPacket:
         if not data.startswith(b'DATA'):
             raise ValueError("Not a 'DATA' packet.")
 
-        data = data[5:]
-
-        for i in range(len(data) // 36):
-            index = struct.unpack_from('<i', data, 0 + (i * 36))[0]
-
-            values = []
-            for j in range(8):
-                value = struct.unpack_from('<f', data, 4 + (i * 36) + (j * 4))[0]
-                values.append(value)
-
-            self.data[index] = values
+        if sys.byteorder != 'little':
+            self.reset()
+            for offset in range(5, len(data) - 35, 36):
+                row = self._row.unpack_from(data, offset)
+                self.data[row[0]] = row[1:]
+            return
+
+        rows = (len(data) - 5) // 36
+
+        layout = self._layout
+        if layout is not None and len(self._raw[0]) == len(data):
+            for row in range(rows):
+                index, = self._index.unpack_from(data, 5 + row * 36)
+                if index != layout[row]:
+                    break
+            else:
+                self._raw[0][:] = data
+                return
+
+        # The indices have changed, so make a new buffer to view. The old one
+        # is left alone, in case anything still holds a view of it. The rows
+        # start three bytes in, so that they are aligned after the header.
+        raw = memoryview(bytearray(3) + data)
+        rows_view = raw[8:8 + rows * 36]
+        values = rows_view.cast('f')
+        indices = rows_view.cast('i')
+        self._raw = (raw[3:], values, indices)
+
+        self.data.clear()
+        layout = []
+        for row in range(rows):
+            index = indices[row * 9]
+            self.data[index] = values[row * 9 + 1:row * 9 + 9]
+            layout.append(index)
+        self._layout = layout
 
     def write(self):
         """
@@ -65,28 +132,53 @@ class DataPacket:
             The array of bytes.
         """
 
-        data = b''
+        rows = []
 
         for index, values in self.data.items():
-            data += struct.pack('<i', index)
-
             assert len(values) == 8
 
-            for value in values:
-                data += struct.pack('<f', value)
+            rows.append(self._row.pack(index, *values))
 
-        assert len(data) == len(self.data) * 36
+        return b'DATA\x00' + b''.join(rows)
 
-        return b'DATA\x00' + data
+    def pack(self):
+        """
+        Write the contents of this packet into a buffer kept by the packet,
+        rather than a new byte string, so sending it doesn't allocate.
+
+        Returns
+        -------
+        memoryview
+            The bytes, which are overwritten by the next call, so must be sent
+            straight away.
+        """
+
+        size = 5 + 36 * len(self.data)
+        packed = self._packed
+        if packed is None or len(packed) != size:
+            packed = memoryview(bytearray(size))
+            packed[:5] = b'DATA\x00'
+            self._packed = packed
+
+        # The values are unpacked, rather than passed as *values, which would
+        # build a tuple of the arguments.
+        offset = 5
+        for index in self.data:
+            a, b, c, d, e, f, g, h = self.data[index]
+            self._row.pack_into(packed, offset, index, a, b, c, d, e, f, g, h)
+            offset += 36
+
+        return packed
 
     def __getitem__(self, index):
         """
-        Get the 8-valued tuple for the specific index.
+        Get the 8 values for the specific index.
 
         Returns
         -------
-        tuple
-            A tuple of length 8 containing floats.
+        sequence
+            A sequence of length 8 containing floats. For received packets
+            this is a view, which changes when the packet is reused.
 
         Raises
         ------
@@ -120,6 +212,7 @@ class DataPacket:
             raise ValueError('Tried to set values of length {}, should be 8.'
                              .format(len(values)))
         self.data[index] = values
+        self._layout = None
 
     def read_speeds(self):
         """
@@ -148,7 +241,7 @@ class DataPacket:
     def write_joystick_elevator_aileron_rudder(self, elevator=LEAVE_ALONE,
                                                aileron=LEAVE_ALONE,
                                                rudder=LEAVE_ALONE):
-        self[8] = (elevator, aileron, rudder) + (0,) * 5
+        self[8] = (elevator, aileron, rudder, 0, 0, 0, 0, 0)
 
     def read_angular_moments(self):
         """
@@ -412,19 +505,222 @@ class DataPacket:
 
 
 class CommandPacket:
+    """
+    Runs a command, such as ``'sim/flight_controls/brakes_toggle_regular'``.
+
+    Parameters
+    ----------
+    command : str
+        The command to run.
+    data : bytes
+        The raw bytes in the packet, passed to :func:`.read`.
+    """
+
+    # The command is kept encoded, and only decoded when it is read. The
+    # written packet is kept too, so sending the same command again doesn't
+    # allocate.
+    __slots__ = ('_command', '_encoded', '_written')
+
     def __init__(self, command=None, data=None):
         self.command = command
 
         if data is not None:
             self.read(data)
 
+    @property
+    def command(self):
+        if self._command is None and self._encoded is not None:
+            self._command = self._encoded.decode()
+        return self._command
+
+    @command.setter
+    def command(self, command):
+        self._command = command
+        self._encoded = None if command is None else command.encode()
+        self._written = None
+
+    def reset(self):
+        """Remove the command, so the packet can be reused."""
+
+        self.command = None
+
     def read(self, data):
         if not data.startswith(b'CMND'):
-            raise ValueError("Not a 'DATA' packet.")
+            raise ValueError("Not a 'CMND' packet.")
+
+        self._command = None
+        self._encoded = data[5:]
+        self._written = None
+
+    def write(self):
+        return b'CMND0' + self._encoded
+
+    def pack(self):
+        if self._written is None:
+            self._written = self.write()
+        return self._written
+
+
+class SelectPacket:
+    """
+    Asks X-Plane to start sending the given indices in its 'DATA' packets.
+
+    Parameters
+    ----------
+    indices : iterable of int
+        The indices to select.
+    data : bytes
+        The raw bytes in the packet, passed to :func:`.read`.
+    """
+
+    __slots__ = ('indices',)
+
+    header = b'DSEL'
+
+    def __init__(self, indices=(), data=None):
+        self.indices = list(indices)
+
+        if data is not None:
+            self.read(data)
+
+    def read(self, data):
+        if not data.startswith(self.header):
+            raise ValueError("Not a '{}' packet.".format(self.header.decode()))
 
         data = data[5:]
 
-        self.command = data.decode()
+        self.indices = [struct.unpack_from('<i', data, i * 4)[0]
+                        for i in range(len(data) // 4)]
+
+    def write(self):
+        return self.header + b'\x00' \
+            + struct.pack('<{}i'.format(len(self.indices)), *self.indices)
+
+    def pack(self):
+        return self.write()
+
+
+class UnselectPacket(SelectPacket):
+    """
+    Asks X-Plane to stop sending the given indices in its 'DATA' packets.
+
+    Parameters
+    ----------
+    indices : iterable of int
+        The indices to unselect.
+    data : bytes
+        The raw bytes in the packet, passed to :func:`.read`.
+    """
+
+    __slots__ = ()
+
+    header = b'USEL'
+
+
+class DatarefPacket:
+    """
+    Sets the value of a dataref.
+
+    Parameters
+    ----------
+    dataref : str
+        The path of the dataref, such as
+        ``'sim/network/dataout/network_data_rate'``.
+    value : float
+        The value to set.
+    data : bytes
+        The raw bytes in the packet, passed to :func:`.read`.
+    """
+
+    __slots__ = ('dataref', 'value')
+
+    def __init__(self, dataref=None, value=0.0, data=None):
+        self.dataref = dataref
+        self.value = value
+
+        if data is not None:
+            self.read(data)
+
+    def read(self, data):
+        if not data.startswith(b'DREF'):
+            raise ValueError("Not a 'DREF' packet.")
+
+        self.value = struct.unpack_from('<f', data, 5)[0]
+        self.dataref = data[9:].split(b'\x00', 1)[0].decode()
 
     def write(self):
-        return b'CMND0' + self.command.encode()
+        dataref = self.dataref.encode()
+        if len(dataref) >= 500:
+            raise ValueError('Dataref path is too long: {}.'
+                             .format(self.dataref))
+
+        return b'DREF\x00' + struct.pack('<f', self.value) \
+            + dataref.ljust(500, b'\x00')
+
+    def pack(self):
+        return self.write()
+
+
+class PacketPool:
+    """
+    A pool of reusable packets, to avoid allocating a new packet for every
+    one which is sent or received.
+
+    Parameters
+    ----------
+    packet_class : type
+        The class of packet in the pool, which must have a ``reset`` method.
+    size : int
+        The most packets to keep for reuse.
+    reset : bool
+        Whether to reset packets when they are released. Packets which are
+        only ever refilled with :meth:`~DataPacket.read` don't need to be, and
+        keep their buffers if they aren't.
+    """
+
+    __slots__ = ('packet_class', 'size', 'reset', '_packets', '_borrowed')
+
+    def __init__(self, packet_class, size=4, reset=True):
+        self.packet_class = packet_class
+        self.size = size
+        self.reset = reset
+        self._packets = []
+        self._borrowed = []
+
+    def acquire(self):
+        """
+        Get a packet from the pool, or a new one if it is empty.
+        """
+
+        try:
+            return self._packets.pop()
+        except IndexError:
+            return self.packet_class()
+
+    def release(self, packet):
+        """
+        Return a packet to the pool. It must not be used afterwards.
+        """
+
+        if len(self._packets) < self.size:
+            if self.reset:
+                packet.reset()
+            self._packets.append(packet)
+
+    def borrow(self):
+        """
+        Acquire a packet for the duration of a ``with`` block.
+
+        The pool is its own context manager, so borrowing doesn't allocate.
+        Borrows can be nested, and are released in reverse order.
+        """
+
+        return self
+
+    def __enter__(self):
+        packet = self.acquire()
+        self._borrowed.append(packet)
+        return packet
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release(self._borrowed.pop())